@@ -16,10 +16,17 @@
 #
 # If you do not alter this notice, a recipient may use your version of
 # this file under either the MPL or the EUPL.
+import functools
+import re
 import unicodedata
+import weakref
+from array import array
+from collections import Counter
+from itertools import chain
 from typing import (
     Callable,
     Dict,
+    FrozenSet,
     Set,
     Tuple,
     Iterable,
@@ -31,32 +38,134 @@ from typing import (
 )
 from .keygenerator import ReplacementList
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm.decl_api import DeclarativeMeta
 from sqlalchemy.orm import sessionmaker, relationship, registry
 
 RepKeyValue = Iterable[Tuple[str, str]]
 
 
+@functools.lru_cache(maxsize=4096)
+def _nfd_base(char: str) -> str:
+    """the first character of the canonical decomposition of `char`"""
+    return unicodedata.normalize("NFD", char)[0]
+
+
+class _StripTable(dict):
+    """translation table for str.translate() which maps each character whose
+    canonical decomposition starts with one of `chars` to that base
+    character and leaves all other characters alone. Entries are computed
+    the first time a character is seen.
+    """
+
+    __slots__ = ("chars",)
+
+    def __init__(self, chars: FrozenSet[str]):
+        super().__init__()
+        self.chars = chars
+
+    def __missing__(self, codepoint: int) -> int:
+        # shared by the tables for all sets of chars.
+        base = _nfd_base(chr(codepoint))
+        self[codepoint] = ord(base) if base in self.chars else codepoint
+        return self[codepoint]
+
+
+_strip_tables: Dict[FrozenSet[str], _StripTable] = {}
+
+
+def _get_strip_table(chars: Set[str]) -> _StripTable:
+    chars = frozenset(chars)
+    try:
+        return _strip_tables[chars]
+    except KeyError:
+        return _strip_tables.setdefault(chars, _StripTable(chars))
+
+
+# fill in the table for the default vowels ahead of time for the ranges
+# romanized text is actually written in: ASCII, the Latin-1 supplement,
+# Latin Extended-A/B and Latin Extended Additional (ḥ, ṭ, ṣ...).
+_default_table = _get_strip_table(set("ieaou"))
+for _range in (range(0x250), range(0x1E00, 0x1F00)):
+    for _codepoint in _range:
+        _default_table[_codepoint]
+del _default_table, _range, _codepoint
+
+
 def strip_chars(
     rep_keyvalue: RepKeyValue, chars: Set[str] = set("ieaou")
 ) -> RepKeyValue:
     """strips all diacritics off of certain chars in a Replacement.keyvalue.
     Returns the update keyvalue.
     """
-    new_keyvalue = []
-    for source, target in rep_keyvalue:
-        new = ""
-        for c in source:
-            decomposed = unicodedata.normalize("NFD", c)
-            if decomposed[0] in chars:
-                new += decomposed[0]
-            else:
-                new += c
-        new_keyvalue.append((new, target))
-    return new_keyvalue
+    table = _get_strip_table(chars)
+    # ASCII characters decompose to themselves, so there is nothing to strip
+    # and the (very common) all-ASCII source can skip the translation.
+    return [
+        (source if source.isascii() else source.translate(table), target)
+        for source, target in rep_keyvalue
+    ]
 
 
 CONV_TEMP = "{!r} -> {!r}"
+_MISSING = object()
+
+
+def _independent(replacements: Dict[str, str]) -> bool:
+    """check if applying the replacements one after another gives the same
+    result as applying all of them in a single left-to-right pass. This is
+    the case when no replacement is empty or produces characters used in any
+    key, and no two keys can overlap each other in a string.
+    """
+    keys = list(replacements)
+    if not (all(keys) and all(replacements.values())):
+        return False
+    key_chars = set("".join(keys))
+    if any(key_chars.intersection(v) for v in replacements.values()):
+        return False
+    for a in keys:
+        for b in keys:
+            if a == b:
+                continue
+            if b in a or any(a.endswith(b[:i]) for i in range(1, len(b))):
+                return False
+    return True
+
+
+def _replacer(replacements: Dict[str, str]) -> Callable[[str], str]:
+    """return a function which applies `replacements` to a string in order.
+    If the order can't make a difference, the string is scanned only once:
+    with str.translate if all keys are single characters, otherwise with one
+    compiled regex matching all keys.
+    """
+    items = list(replacements.items())
+    if not items or not _independent(replacements):
+
+        def replace_each(string: str) -> str:
+            for k, v in items:
+                string = string.replace(k, v)
+            return string
+
+        return replace_each
+
+    mapping = dict(items)
+    if all(len(k) == 1 for k in mapping):
+        table = str.maketrans(mapping)
+
+        def translate(string: str) -> str:
+            return string.translate(table)
+
+        return translate
+
+    pattern = re.compile(
+        "|".join(map(re.escape, sorted(mapping, key=len, reverse=True)))
+    )
+
+    def replace_all(string: str) -> str:
+        return pattern.sub(lambda match: mapping[match.group()], string)
+
+    return replace_all
 
 
 def replacer_maker(
@@ -81,48 +190,49 @@ def replacer_maker(
     of transcription where human error may have occured.
     """
     pair_reps = {tuple(v): k for k, v in pair_replacements.items()}
+    simple_replace = _replacer(simple_replacements)
     pairs_str = "\n".join(CONV_TEMP.format(k, v) for k, v in pair_reps.items())
     simple_str = "\n".join(
         CONV_TEMP.format(k, v) for k, v in simple_replacements.items()
     )
 
     def replace(rep_keyvalue: RepKeyValue) -> RepKeyValue:
-        """takes a RepKeyValue as an argument and returns a new one with
-        different romanized values.
+        get_pair = pair_reps.get
+        new_keyvalue = []
+        append = new_keyvalue.append
+        for pair in rep_keyvalue:
+            new = get_pair(pair, _MISSING)
+            if new is _MISSING:
+                new = simple_replace(pair[0])
+            append((new, pair[1]))
+        return new_keyvalue
 
-        first, matching pairs are substituted:
+    # set once here; a .format() call in the docstring position is an
+    # ordinary expression which would be evaluated on every call.
+    replace.__doc__ = """takes a RepKeyValue as an argument and returns a new one
+    with different romanized values.
 
-        {pairs}
+    first, matching pairs are substituted:
 
-        Then, simple replaments are preformed:
+    {pairs}
 
-        {simple}
-        """.format(
-            pairs=pairs_str, simple=simple_str
-        )
-        new_keyvalue = []
-        for pair in rep_keyvalue:
-            target = pair[1]
-            if pair in pair_reps:
-                new_keyvalue.append((pair_reps[pair], target))
-            else:
-                new = pair[0]
-                for k, v in simple_replacements.items():
-                    new = new.replace(k, v)
-                new_keyvalue.append((new, target))
-        return new_keyvalue
+    Then, simple replaments are preformed:
 
+    {simple}
+    """.format(
+        pairs=pairs_str, simple=simple_str
+    )
     return replace
 
 
 def get_combos(rep_key: Mapping[str, ReplacementList]) -> Set[Tuple[str, str]]:
     """return a set of all keyvalue pairs generated by a standard."""
-    return set(
-        pair for replist in rep_key.values() for rep in replist for pair in rep.keyvalue
-    )
+    reps = chain.from_iterable(rep_key.values())
+    return set(chain.from_iterable([rep.keyvalue for rep in reps]))
 
 
 CacheStorageDict = Dict[str, Dict[str, int]]
+CacheRow = Tuple[str, str, Union[int, str]]
 
 
 class CacheObject:
@@ -130,18 +240,42 @@ class CacheObject:
     pairs.
     """
 
-    def __init__(self, seed: Optional[CacheStorageDict] = None):
-        if seed:
+    def __init__(
+        self, seed: Union[CacheStorageDict, Iterable[CacheRow], None] = None
+    ):
+        if not seed:
+            self.data = {}
+        elif isinstance(seed, dict):
             self.data = seed
         else:
             self.data = {}
+            self.update(seed)
+
+    @classmethod
+    def from_dict(cls, data: CacheStorageDict) -> "CacheObject":
+        """wrap an existing {source: {target: count}} dictionary without
+        copying it.
+        """
+        new = cls.__new__(cls)
+        new.data = data
+        return new
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[CacheRow]) -> "CacheObject":
+        """build a cache from (source, target, count) rows."""
+        new = cls.from_dict({})
+        new.update(rows)
+        return new
 
     def add(self, source: str, target: str, count: Union[int, str] = 1) -> None:
         count = int(count)
-        current = self.data.setdefault(source, {}).setdefault(target, 0)
-        self.data[source][target] = current + count
+        targets = self.data.get(source)
+        if targets is None:
+            self.data[source] = {target: count}
+        else:
+            targets[target] = targets.get(target, 0) + count
 
-    def update(self, matches: Iterable[Tuple[str, str, Union[int, str]]]) -> None:
+    def update(self, matches: Iterable[CacheRow]) -> None:
         for row in matches:
             self.add(*row)
 
@@ -165,21 +299,110 @@ class CacheObject:
             return default
 
     def __iter__(self):
-        for source, targets in self.data.items():
-            for target, count in targets.items():
-                yield source, target, count
+        return iter(
+            [
+                (source, target, count)
+                for source, targets in self.data.items()
+                for target, count in targets.items()
+            ]
+        )
 
     def inverted(self, new=None):
-        if new is None:
-            new = CacheObject()
+        if new is not None:
+            for source, target, count in self:
+                new.add(target, source, count)
+            return new
+        # each (source, target) pair only comes up once, so the inverted
+        # dictionary can be filled in directly without summing counts.
+        data: CacheStorageDict = {}
         for source, target, count in self:
-            new.add(target, source, count)
-        return new
+            sources = data.get(target)
+            if sources is None:
+                data[target] = {source: count}
+            else:
+                sources[source] = count
+        return CacheObject.from_dict(data)
 
     def serializable(self):
         return self.data
 
 
+class DenseCacheObject(CacheObject):
+    """a CacheObject which stores sources, targets and counts in three
+    parallel arrays instead of a dictionary of dictionaries, with an index
+    from each (source, target) pair to its position. Iterating and
+    inverting work on whole arrays rather than walking nested dicts.
+    """
+
+    def __init__(
+        self, seed: Union[CacheStorageDict, Iterable[CacheRow], None] = None
+    ):
+        self.sources: List[str] = []
+        self.targets: List[str] = []
+        self.counts = array("q")
+        self.index: Dict[Tuple[str, str], int] = {}
+        self._by_source: Dict[str, List[int]] = {}
+        if seed:
+            self.update(
+                CacheObject.from_dict(seed) if isinstance(seed, dict) else seed
+            )
+
+    @classmethod
+    def from_dict(cls, data: CacheStorageDict) -> "DenseCacheObject":
+        return cls.from_rows(CacheObject.from_dict(data))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[CacheRow]) -> "DenseCacheObject":
+        new = cls()
+        new.update(rows)
+        return new
+
+    def add(self, source: str, target: str, count: Union[int, str] = 1) -> None:
+        key = (source, target)
+        i = self.index.get(key)
+        if i is None:
+            i = self.index[key] = len(self.counts)
+            self._by_source.setdefault(source, []).append(i)
+            self.sources.append(source)
+            self.targets.append(target)
+            self.counts.append(int(count))
+        else:
+            self.counts[i] += int(count)
+
+    def __getitem__(
+        self, value: Union[str, Tuple[str, str]]
+    ) -> Union[Dict[str, int], int]:
+
+        if isinstance(value, tuple):
+            return self.counts[self.index[value]]
+        targets, counts = self.targets, self.counts
+        return {targets[i]: counts[i] for i in self._by_source[value]}
+
+    def __iter__(self):
+        return zip(self.sources, self.targets, self.counts)
+
+    def inverted(self, new=None):
+        if new is not None:
+            return super().inverted(new)
+        new = DenseCacheObject()
+        new.sources = self.targets.copy()
+        new.targets = self.sources.copy()
+        new.counts = array("q", self.counts)
+        new.index = dict(zip(zip(new.sources, new.targets), range(len(new))))
+        for i, source in enumerate(new.sources):
+            new._by_source.setdefault(source, []).append(i)
+        return new
+
+    def __len__(self):
+        return len(self.counts)
+
+    def serializable(self):
+        data: CacheStorageDict = {}
+        for source, target, count in self:
+            data.setdefault(source, {})[target] = count
+        return data
+
+
 mapper_registry = registry()
 
 
@@ -192,13 +415,30 @@ class Base(metaclass=DeclarativeMeta):
     metadata = mapper_registry.metadata
 
     def __repr__(self):
-        name = self.__class__.__name__
-        attrs = (
-            "%s=%r" % (attr, getattr(self, attr))
-            for attr in self._sa_class_manager.keys()
-            if not (attr[-2:] == "id" or isinstance(getattr(self, attr), list))
+        cls = type(self)
+        attrs = cls.__dict__.get("_repr_attrs")
+        if attrs is None:
+            attrs = cls._repr_attrs = _repr_attrs(cls)
+        return "%s(%s)" % (
+            cls.__name__,
+            ", ".join("%s=%r" % (attr, getattr(self, attr)) for attr in attrs),
         )
-        return name + "(%s)" % ", ".join(attrs)
+
+
+def _repr_attrs(cls) -> Tuple[str, ...]:
+    """names of the attributes shown by Base.__repr__: everything but ids
+    and one-to-many relationships. Worked out from the mapper, so showing an
+    object doesn't have to load its collections first.
+    """
+    relationships = sa.inspect(cls).relationships
+    return tuple(
+        attr
+        for attr in cls._sa_class_manager.keys()
+        if not (
+            attr.endswith("id")
+            or (attr in relationships and relationships[attr].uselist)
+        )
+    )
 
 
 class Source(Base):
@@ -223,6 +463,15 @@ class Match(Base):
 
 
 sa.Index("matches_idx", Match.original_id, Match.romanized_id, unique=True)
+# CacheDB looks up matches by romanized form far more often than by
+# original. Including the count lets sqlite answer those lookups from the
+# index alone, without visiting the table rows.
+matches_romanized_idx = sa.Index(
+    "matches_romanized_idx",
+    Match.romanized_id,
+    Match.original_id,
+    Match.count,
+)
 
 
 class Standard(Base):
@@ -251,14 +500,79 @@ class Romanized(Base):
 
 sa.Index("standard_form", Romanized.form, Romanized.standard_id, unique=True)
 
+# applied to every new sqlite connection. WAL with synchronous=NORMAL is
+# still durable against application crashes, but skips most of the fsyncs
+# which otherwise dominate bulk writes.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA mmap_size=268435456",
+)
+# SQLAlchemy renders each of our statements to the same SQL text every time,
+# so a larger statement cache in the driver lets it reuse prepared statements.
+SQLITE_CONNECT_ARGS = {"cached_statements": 512}
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+# writes use INSERT ... ON CONFLICT where the backend has it. These spell it
+# the same way.
+UPSERT_INSERTS = {"sqlite": sqlite_insert, "postgresql": postgresql_insert}
+
+
+def _chunks(items, size=500):
+    """split a sequence into lists short enough to be used as bound
+    parameters for an IN clause.
+    """
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
 
 class DBWrapper:
     def __init__(self, sqlachemy_url, echo=False):
-        self.engine = sa.create_engine(sqlachemy_url, echo=echo)
+        url = sa.engine.make_url(sqlachemy_url)
+        backend = url.get_backend_name()
+        # None for databases without INSERT ... ON CONFLICT. Those look up
+        # existing rows before inserting or updating them instead.
+        self._insert = UPSERT_INSERTS.get(backend)
+        if backend == "sqlite":
+            self.engine = sa.create_engine(
+                url, echo=echo, connect_args=SQLITE_CONNECT_ARGS
+            )
+            sa.event.listen(self.engine, "connect", _set_sqlite_pragmas)
+        else:
+            self.engine = sa.create_engine(url, echo=echo)
         Session = sessionmaker(bind=self.engine)
         self.session = Session()
+        # CacheDBs buffer their add() calls. Whatever is buffered goes into
+        # the transaction before it commits, and is dropped (along with the
+        # remembered row ids) if it rolls back, however that happens. Rolling
+        # back a savepoint only drops what was added after it began.
+        self._caches = weakref.WeakSet()
+        self._savepoints = weakref.WeakKeyDictionary()
+        sa.event.listen(self.session, "before_commit", self._before_commit)
+        sa.event.listen(
+            self.session, "after_transaction_create", self._after_begin
+        )
+        sa.event.listen(
+            self.session, "after_soft_rollback", self._after_rollback
+        )
+        # value -> row id for rows known to exist, so repeated writes don't
+        # have to insert and select them again. Dropped on any rollback, since
+        # the rows may be gone.
+        self._id_cache = {Standard: {}, Original: {}, Romanized: {}}
         with self:
             Base.metadata.create_all(self.engine)
+            # create_all() skips indexes on tables which already exist.
+            matches_romanized_idx.create(self.engine, checkfirst=True)
 
     def __enter__(self):
         return self
@@ -269,6 +583,33 @@ class DBWrapper:
         else:
             self.session.commit()
 
+    def flush_caches(self):
+        """write the buffered add() calls of all caches on this database."""
+        for cache in list(self._caches):
+            cache.flush()
+
+    def _before_commit(self, session):
+        self.flush_caches()
+
+    def _after_begin(self, session, transaction):
+        if transaction.nested:
+            # the savepoint may already be open by now, so buffered adds
+            # can't be written before it. Their state is kept to go back to.
+            self._savepoints[transaction] = [
+                (cache, cache._pending.copy()) for cache in self._caches
+            ]
+
+    def _after_rollback(self, session, previous_transaction):
+        for ids in self._id_cache.values():
+            ids.clear()
+        for cache in list(self._caches):
+            cache.discard()
+        if previous_transaction.nested:
+            # adds from before the savepoint are buffered again, including
+            # any which were flushed inside it.
+            for cache, pending in self._savepoints.pop(previous_transaction, ()):
+                cache._pending.update(pending)
+
     def get(self, orig=None, rom=None, standard=None):
         args = []
         if orig:
@@ -285,41 +626,194 @@ class DBWrapper:
             .join(Original)
             .filter(*args)
         )
+        self.flush_caches()
         if orig and rom and standard:
             return query.first()
         else:
             return query
 
     def construct_match(self, orig, rom, standard):
-        original = self.session.query(Original).filter(
-            Original.form == orig
-        ).first() or Original(form=orig)
-        romanized = (
-            self.session.query(Romanized)
-            .join(Standard)
-            .filter(Romanized.form == rom, Standard.st == standard)
-            .first()
+        """make a new Match for the given forms. the forms and the standard
+        are created in the database if they don't exist yet.
+        """
+        ((original_id, romanized_id),) = self._resolve_ids(
+            [(orig, rom, standard)]
+        )
+        return Match(
+            original_id=original_id, romanized_id=romanized_id, count=1
         )
-        if not romanized:
-            st = self.session.query(Standard).filter(
-                Standard.st == standard
-            ).first() or Standard(st=standard)
-            romanized = Romanized(form=rom, standard=st)
-
-        return Match(original=original, romanized=romanized, count=1)
 
     def add(self, orig, rom, standard, count=1, source=None):
-        match = self.get(orig, rom, standard)
-        if match:
-            match = match[0]
-            match.count += count
-            if source:
-                self.session.add(Source(address=source, match_id=match.id))
+        (key,) = self._upsert_matches([(orig, rom, standard, int(count))])
+        if source:
+            match_id = self.session.execute(
+                sa.select(Match.id).where(
+                    Match.original_id == key[0], Match.romanized_id == key[1]
+                )
+            ).scalar_one()
+            self.session.add(Source(address=source, match_id=match_id))
+
+    def add_many(self, rows):
+        """add a batch of matches in one go. `rows` is an iterable of
+        (orig, rom, standard, count) tuples. Missing forms and standards are
+        created and the match counts are incremented with a single UPSERT
+        statement executed for all rows.
+        """
+        rows = [(orig, rom, st, int(count)) for orig, rom, st, count in rows]
+        if rows:
+            self._upsert_matches(rows)
+
+    def _resolve_ids(self, rows):
+        """take (orig, rom, standard, ...) rows and return the
+        (original_id, romanized_id) pair for each, inserting whatever is
+        missing. Each table is handled with one insert and one select per
+        batch rather than with queries for each row.
+        """
+        # pending ORM objects must hit the database before the core
+        # statements below look for their ids.
+        self.session.flush()
+        standard_ids = self._ensure_ids(
+            Standard, Standard.st, {row[2] for row in rows}
+        )
+        original_ids = self._ensure_ids(
+            Original, Original.form, {row[0] for row in rows}
+        )
+        romanized_ids = self._ensure_romanized_ids(
+            {(row[1], standard_ids[row[2]]) for row in rows}
+        )
+        return [
+            (original_ids[orig], romanized_ids[rom, standard_ids[st]])
+            for orig, rom, st, *_ in rows
+        ]
+
+    def _upsert_matches(self, rows):
+        """does the work for add() and add_many(). returns the
+        (original_id, romanized_id) pair for each row.
+        """
+        keys = self._resolve_ids(rows)
+        if self._insert is None:
+            self._add_counts(keys, rows)
+        else:
+            stmt = self._insert(Match)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Match.original_id, Match.romanized_id],
+                set_={"count": Match.count + stmt.excluded.count},
+            )
+            self.session.execute(
+                stmt,
+                [
+                    {"original_id": o_id, "romanized_id": r_id, "count": row[3]}
+                    for (o_id, r_id), row in zip(keys, rows)
+                ],
+            )
+        # counts were changed behind the back of the ORM and the caches
+        self.session.expire_all()
+        for cache in list(self._caches):
+            cache._get_pair.cache_clear()
+        return keys
+
+    def _add_counts(self, keys, rows):
+        """_upsert_matches() for databases without an UPSERT: the counts of
+        existing matches are updated, and the others are inserted.
+        """
+        counts = Counter()
+        for key, row in zip(keys, rows):
+            counts[key] += row[3]
+        execute = self.session.execute
+        existing = set()
+        for chunk in _chunks({o_id for o_id, _ in counts}):
+            existing.update(
+                execute(
+                    sa.select(Match.original_id, Match.romanized_id).where(
+                        Match.original_id.in_(chunk)
+                    )
+                )
+            )
+        updates = [
+            {"o_id": o_id, "r_id": r_id, "n": n}
+            for (o_id, r_id), n in counts.items()
+            if (o_id, r_id) in existing
+        ]
+        if updates:
+            execute(
+                sa.update(Match)
+                .where(
+                    Match.original_id == sa.bindparam("o_id"),
+                    Match.romanized_id == sa.bindparam("r_id"),
+                )
+                .values(count=Match.count + sa.bindparam("n")),
+                updates,
+            )
+        inserts = [
+            {"original_id": o_id, "romanized_id": r_id, "count": n}
+            for (o_id, r_id), n in counts.items()
+            if (o_id, r_id) not in existing
+        ]
+        if inserts:
+            execute(sa.insert(Match), inserts)
+
+    def _ensure_ids(self, table, column, values):
+        """insert any of `values` not yet in the unique `column` and return a
+        dictionary mapping each value to its row id. Values which have already
+        been seen are answered from memory.
+        """
+        ids = self._id_cache[table]
+        values = [v for v in values if v not in ids]
+        if not values:
+            return ids
+        if self._insert is None:
+            self._select_ids(table, column, values)
+            values = [v for v in values if v not in ids]
+            if not values:
+                return ids
+            stmt = sa.insert(table)
+        else:
+            stmt = self._insert(table).on_conflict_do_nothing()
+        self.session.execute(stmt, [{column.key: v} for v in values])
+        self._select_ids(table, column, values)
+        return ids
+
+    def _select_ids(self, table, column, values):
+        ids = self._id_cache[table]
+        for chunk in _chunks(values):
+            ids.update(
+                (v, id_)
+                for id_, v in self.session.execute(
+                    sa.select(table.id, column).where(column.in_(chunk))
+                )
+            )
+
+    def _ensure_romanized_ids(self, pairs):
+        ids = self._id_cache[Romanized]
+        pairs = [pair for pair in pairs if pair not in ids]
+        if not pairs:
+            return ids
+        if self._insert is None:
+            self._select_romanized_ids(pairs)
+            pairs = [pair for pair in pairs if pair not in ids]
+            if not pairs:
+                return ids
+            stmt = sa.insert(Romanized)
         else:
-            match = self.construct_match(orig, rom, standard)
-            if source:
-                match.sources = [Source(address=source)]
-            self.session.add(match)
+            stmt = self._insert(Romanized).on_conflict_do_nothing()
+        self.session.execute(
+            stmt,
+            [{"form": form, "standard_id": st_id} for form, st_id in pairs],
+        )
+        self._select_romanized_ids(pairs)
+        return ids
+
+    def _select_romanized_ids(self, pairs):
+        ids = self._id_cache[Romanized]
+        for chunk in _chunks({form for form, _ in pairs}):
+            ids.update(
+                ((form, st_id), id_)
+                for id_, form, st_id in self.session.execute(
+                    sa.select(
+                        Romanized.id, Romanized.form, Romanized.standard_id
+                    ).where(Romanized.form.in_(chunk))
+                )
+            )
 
     def __iter__(self):
         query = (
@@ -328,6 +822,7 @@ class DBWrapper:
             .join(Romanized)
             .join(Standard)
         )
+        self.flush_caches()
         yield from query
 
     def mkcache(self, standard, seed=None):
@@ -335,6 +830,11 @@ class DBWrapper:
 
 
 class CacheDB(CacheObject):
+    # add() calls without a source address are collected in memory and
+    # written with one batched UPSERT once this many pairs are pending, before
+    # any read from the database and before it commits.
+    flush_threshold = 10000
+
     def __init__(self, db_wrapper, standard, seed=None):
         if isinstance(db_wrapper, DBWrapper):
             self.db = db_wrapper
@@ -342,31 +842,130 @@ class CacheDB(CacheObject):
             self.db = DBWrapper(db_wrapper)
 
         self.standard = standard
+        # a cache only ever deals with one standard, so reads filter on the
+        # indexed romanized.standard_id instead of joining the standards
+        # table. The id itself is bound as a parameter; see standard_id.
+        # statements are built once per cache so each lookup only binds
+        # parameters instead of rebuilding (and re-hashing) the query.
+        matches = (
+            sa.select(Romanized.form, Original.form, Match.count)
+            .join(Romanized, Romanized.id == Match.romanized_id)
+            .join(Original, Original.id == Match.original_id)
+            .where(Romanized.standard_id == sa.bindparam("standard_id"))
+        )
+        self._sql_iter = matches
+        self._sql_get_src = matches.where(
+            Romanized.form == sa.bindparam("source")
+        )
+        self._sql_get_target = matches.where(
+            Original.form == sa.bindparam("target")
+        )
+        self._sql_get_pair = self._sql_get_src.where(
+            Original.form == sa.bindparam("target")
+        ).with_only_columns(Match.count)
+        # recently seen (source, target) counts. the database clears them on
+        # every write.
+        self._get_pair = functools.lru_cache(maxsize=4096)(self._query_pair)
+        self._pending: Counter = Counter()
+        self.db._caches.add(self)
+        if seed is not None:
+            if isinstance(seed, dict):
+                seed = CacheObject.from_dict(seed)
+            self.add_many(seed)
+
+    @property
+    def standard_id(self):
+        """the row id of this cache's standard, or None if the database
+        doesn't have it yet. Once found, it's kept with the other known ids
+        of the DBWrapper, which forgets them when a transaction rolls back.
+        """
+        ids = self.db._id_cache[Standard]
+        try:
+            return ids[self.standard]
+        except KeyError:
+            pass
+        standard_id = self.db.session.execute(
+            sa.select(Standard.id).where(Standard.st == self.standard)
+        ).scalar()
+        if standard_id is not None:
+            ids[self.standard] = standard_id
+        return standard_id
 
     def add(self, source, target, count=1, addr=None):
-        self.db.add(target, source, self.standard, count, addr)
+        if addr:
+            self.db.add(target, source, self.standard, count, addr)
+            return
+        if not self._pending and not self.db.session.in_transaction():
+            # buffered adds belong to a transaction, so a rollback which
+            # comes before the flush still reaches the listeners.
+            self.db.session.begin()
+        self._pending[source, target] += int(count)
+        if len(self._pending) >= self.flush_threshold:
+            self.flush()
+
+    def flush(self):
+        """write pending add() calls to the database."""
+        if self._pending:
+            pending, self._pending = self._pending, Counter()
+            self.add_many(
+                (source, target, count)
+                for (source, target), count in pending.items()
+            )
+
+    def discard(self):
+        """forget pending add() calls and cached counts."""
+        self._pending.clear()
+        self._get_pair.cache_clear()
+
+    def add_many(self, rows: Iterable[CacheRow]):
+        """add (source, target, count) rows in a single batch."""
+        self.db.add_many(
+            (target, source, self.standard, count)
+            for source, target, count in rows
+        )
 
     def __enter__(self):
         return self
 
-    def __exit__(self, *args):
-        return self.db.__exit__(*args)
+    def __exit__(self, type, value, traceback):
+        return self.db.__exit__(type, value, traceback)
 
     def __iter__(self):
-        query = self.db.get(standard=self.standard)
-        return ((r.form, o.form, m.count) for m, r, s, o in query)
+        self.db.flush_caches()
+        return iter(
+            self.db.session.execute(
+                self._sql_iter, {"standard_id": self.standard_id}
+            )
+        )
+
+    def _query_pair(self, source, target):
+        row = self.db.session.execute(
+            self._sql_get_pair,
+            {
+                "standard_id": self.standard_id,
+                "source": source,
+                "target": target,
+            },
+        ).fetchone()
+        if row is None:
+            raise KeyError((source, target))
+        return row[0]
 
     def __getitem__(self, key):
+        self.db.flush_caches()
         if isinstance(key, tuple):
-            return self.db.get(key[1], key[0], self.standard)[0].count
-        results = self.db.get(rom=key, standard=self.standard)
-        return {o.form: m.count for m, r, s, o in results}
+            return self._get_pair(*key)
+        results = self.db.session.execute(
+            self._sql_get_src, {"standard_id": self.standard_id, "source": key}
+        )
+        return {target: count for _, target, count in results}
 
     def get_target(self, key):
-        results = self.db.get(key, standard=self.standard)
-        return {r.form: m.count for m, r, s, o in results}
+        self.db.flush_caches()
+        results = self.db.session.execute(
+            self._sql_get_target, {"standard_id": self.standard_id, "target": key}
+        )
+        return {source: count for source, _, count in results}
 
-    def serializable(self) -> Dict[str, Dict[str, int]]:
-        obj = CacheObject()
-        obj.update(self)
-        return obj.data
+    def serializable(self) -> CacheStorageDict:
+        return CacheObject.from_rows(self).data
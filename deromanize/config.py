@@ -1,9 +1,19 @@
+import copy
+import marshal
+import os
+import sys
 from pathlib import Path
 from typing import Dict, Iterable
 from . import KeyGenerator
 from .cacheutils import DBWrapper
+from .tools import profile_digest
 import yaml
 
+try:
+    from yaml import CSafeLoader as YAMLLoader
+except ImportError:
+    from yaml import SafeLoader as YAMLLoader
+
 CFG_PATHS = [
     Path() / ".deromanize.yml",
     Path.home() / ".config" / "deromanize" / "config.yml",
@@ -18,7 +28,11 @@ class ConfigError:
 class Config:
     def __init__(self, path=None, loader=None):
         self.path = path
-        self.loader = loader or (lambda path: yaml.safe_load(open(str(path))))
+        self.loader = loader or load_yaml
+        self.profile_loader = loader or load_profile
+        # parsed profiles. KeyGenerator modifies the profile it is given, so
+        # get_profile() hands out copies.
+        self._profiles: Dict[str, dict] = {}
         self.user_conf = self.find_configs()
         self.schemas = get_schemas(self.user_conf)
 
@@ -26,7 +40,13 @@ class Config:
         return KeyGenerator(self.get_profile(schema_name), *args, **kwargs)
 
     def get_profile(self, schema_name):
-        return self.loader(self.schemas[schema_name])
+        try:
+            profile = self._profiles[schema_name]
+        except KeyError:
+            path = self.schemas[schema_name]
+            profile = intern_strings(self.profile_loader(path))
+            self._profiles[schema_name] = profile
+        return copy.deepcopy(profile)
 
     def find_configs(self):
         """locate the yaml config file and return it deserialized."""
@@ -57,22 +77,105 @@ class Config:
         return tuple(db.mkcache(name) for name in cache_names)
 
 
+def load_yaml(path):
+    with open(str(path), "rb") as fh:
+        return yaml.load(fh, Loader=YAMLLoader)
+
+
+def sidecar_path(path) -> Path:
+    """where the precompiled copy of the schema at `path` is kept"""
+    path = Path(path)
+    return path.with_name(path.name + ".marshal")
+
+
+def load_profile(path):
+    """load a schema. If `python -m deromanize.precompile` left a marshaled
+    copy next to the YAML file and that copy was made from the same YAML, it
+    is used instead of parsing the file.
+    """
+    try:
+        with sidecar_path(path).open("rb") as fh:
+            digest, profile = marshal.load(fh)
+    except (OSError, EOFError, ValueError, TypeError):
+        # missing, unreadable or written by an incompatible Python.
+        pass
+    else:
+        if digest == profile_digest(path):
+            return profile
+    return load_yaml(path)
+
+
+def write_sidecar(path) -> bool:
+    """write the marshaled copy of a schema, along with the digest of the YAML
+    it was made from. The file is written under a temporary name and then
+    moved into place so readers never see half of it. Returns False if it
+    couldn't be written, e.g. because the directory is read-only; the YAML
+    file is still there to fall back on.
+    """
+    # digested before parsing: if the file changes in between, the copy
+    # won't match either version and is never used.
+    digest = profile_digest(path)
+    try:
+        data = marshal.dumps((digest, load_yaml(path)))
+    except ValueError:
+        return False
+    sidecar = sidecar_path(path)
+    tmp = sidecar.with_name("%s.%d.tmp" % (sidecar.name, os.getpid()))
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, sidecar)
+    except OSError:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        return False
+    return True
+
+
+def intern_strings(obj):
+    """intern all strings in a deserialized profile. The same letters and
+    replacements show up in many groups, and the parser makes a new string
+    object for each occurrence.
+    """
+    if isinstance(obj, str):
+        return sys.intern(obj)
+    if isinstance(obj, dict):
+        return {intern_strings(k): intern_strings(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [intern_strings(i) for i in obj]
+    return obj
+
+
 def get_schemas(user_conf: dict) -> Dict[str, Path]:
     # u_schemas: Union[list, str, None] = user_conf.get('schemas')
     u_schemas = user_conf.get("schemas")
     if u_schemas is None:
-        schema_paths: Iterable[Path] = (PROJ_PATH/'data').glob('*.yml')
-        # schema_paths = (PROJ_PATH / "data").glob("*.yml")
+        schema_paths: Iterable[Path] = _yml_files(PROJ_PATH / "data")
     elif isinstance(u_schemas, list):
         schema_paths = map(Path, u_schemas)
     elif u_schemas.endswith(".yml"):
         schema_paths = [Path(u_schemas)]
     else:
-        schema_paths = Path(u_schemas).glob("*.yml")
+        schema_paths = _yml_files(u_schemas)
 
     return {p.stem: p for p in schema_paths}
 
 
+def _yml_files(directory) -> Iterable[Path]:
+    """the entries of a directory ending in .yml, as glob("*.yml") finds
+    them, and like glob() nothing if the directory can't be read. A single
+    scandir() call, where glob() would also build a Path for every entry.
+    """
+    try:
+        with os.scandir(directory) as entries:
+            return [
+                Path(entry.path) for entry in entries if entry.name.endswith(".yml")
+            ]
+    except OSError:
+        return []
+
+
 def mk_default(resources="resources"):
     respath = Path().absolute() / resources
     config = {
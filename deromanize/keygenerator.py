@@ -23,6 +23,8 @@ import copy
 import functools
 import itertools
 import math
+import operator
+import re
 from collections import abc
 from typing import Tuple, List, Optional
 from .trees import Trie, BackTrie
@@ -49,17 +51,21 @@ class Replacement:
     ReplacementList.
     """
 
-    __slots__ = "keyvalue", "weight", "_hash"
+    # keyvalue doesn't change after a Replacement is made, so the joined
+    # strings in _str and _key are computed once, when first needed.
+    __slots__ = "keyvalue", "weight", "_hash", "_str", "_key"
 
     def __getstate__(self):
         return self.keyvalue, self.weight
 
     def __setstate__(self, state):
         self.keyvalue, self.weight = state
+        self._str = self._key = None
 
     def __init__(self, weight: int, keyvalue: KeyValue):
         self.keyvalue = keyvalue
         self.weight = weight
+        self._str = self._key = None
 
     @classmethod
     def new(cls, weight, value: str, key: str = "") -> "Replacement":
@@ -90,6 +96,8 @@ class Replacement:
         return self.str
 
     def __eq__(self, other):
+        if not isinstance(other, Replacement):
+            return NotImplemented
         return self.keyvalue == other.keyvalue
 
     def __gt__(self, other):
@@ -106,19 +114,25 @@ class Replacement:
 
     @property
     def values(self):
-        return tuple([i[1] for i in self.keyvalue])
+        return tuple([v for _, v in self.keyvalue])
 
     @property
     def keyparts(self):
-        return tuple([i[0] for i in self.keyvalue])
+        return tuple([k for k, _ in self.keyvalue])
 
+    # key and str join the parts straight from keyvalue rather than building
+    # the keyparts or values tuple first.
     @property
     def key(self):
-        return "".join(self.keyparts)
+        if self._key is None:
+            self._key = "".join([k for k, _ in self.keyvalue])
+        return self._key
 
     @property
     def str(self):
-        return "".join(self.values)
+        if self._str is None:
+            self._str = "".join([v for _, v in self.keyvalue])
+        return self._str
 
     def __deepcopy__(self, memo=None):
         return self
@@ -145,6 +159,8 @@ class StatRep(Replacement):
     because Kai likes multiplication.
     """
 
+    __slots__ = ()
+
     def __add__(self, other):
         return add_srs(self, other)
 
@@ -158,6 +174,9 @@ def add_srs(*reps):
     return StatRep(weight, keyvalue)
 
 
+_by_weight = operator.attrgetter("weight")
+
+
 class ReplacementList(abc.MutableSequence):
     """a list of Replacements with a .key attribute containing the key to which
     they belong.
@@ -209,6 +228,17 @@ class ReplacementList(abc.MutableSequence):
         keyparts = values[0].keyparts
         return cls(keyparts, values, weight, broken)
 
+    @classmethod
+    def _wrap(cls, keyparts, data, broken=None):
+        """make a list that takes over `data`, a new list of Replacements,
+        without the checks and the copy in __init__.
+        """
+        new = cls.__new__(cls)
+        new.keyparts = keyparts
+        new.broken = broken
+        new.data = data
+        return new
+
     def _prep_value(self, weight: int, value) -> Replacement:
         """Make sure any input is converted into a Replacement."""
         if isinstance(value, Replacement):
@@ -246,12 +276,21 @@ class ReplacementList(abc.MutableSequence):
         if (n := max(len(self), len(other))) > 10000:
             raise CombinatorialExplosion(n)
 
-        composite_values = [x + y for x, y in itertools.product(self, other)]
+        composite_values = []
+        append = composite_values.append
+        for x in self.data:
+            if type(x) is Replacement:
+                # the same as x + y, without dispatching through __add__ and
+                # add_rs() for every pair.
+                weight, keyvalue = x.weight, x.keyvalue
+                for y in other.data:
+                    append(Replacement(weight + y.weight, keyvalue + y.keyvalue))
+            else:
+                for y in other.data:
+                    append(x + y)
 
-        return ReplacementList(
-            self.keyparts + other.keyparts,
-            composite_values,
-            broken=self.broken,
+        return ReplacementList._wrap(
+            self.keyparts + other.keyparts, composite_values, self.broken
         )
 
     def __setitem__(self, i, value):
@@ -260,6 +299,10 @@ class ReplacementList(abc.MutableSequence):
     def __getitem__(self, i):
         return self.data[i]
 
+    def __iter__(self):
+        # Sequence.__iter__ would call __getitem__ for every item.
+        return iter(self.data)
+
     def __delitem__(self, i):
         del self.data[i]
 
@@ -276,13 +319,23 @@ class ReplacementList(abc.MutableSequence):
 
     def extend(self, iterable, weight=None):
         """incrementally increase weight while extending"""
+        # Replacements go straight in. Anything else goes through
+        # _prep_value() with the same index append() would have used.
+        prep = self._prep_value
         if weight is None:
-            super().extend(iterable)
+            self.data.extend(
+                [
+                    v if isinstance(v, Replacement) else prep(i, v)
+                    for i, v in enumerate(iterable, len(self.data))
+                ]
+            )
         else:
+            append = self.data.append
             for i, value in enumerate(iterable):
-                rep = self._prep_value(i, value)
-                rep.weight += weight
-                self.data.append(rep)
+                if not isinstance(value, Replacement):
+                    value = prep(i, value)
+                value.weight += weight
+                append(value)
 
     def add_weight(self, weight):
         """add additional weight to each item in the list"""
@@ -290,34 +343,30 @@ class ReplacementList(abc.MutableSequence):
             i.weight += weight
 
     def __repr__(self):
-        string = "ReplacementList.new({!r}, [".format(self.key)
-        if not self.data:
-            return string + "])"
-        for i in self:
-            string += "%r, " % ((i.weight, str(i)),)
-        return string[:-2] + "])"
+        return "ReplacementList.new({!r}, [{}])".format(
+            self.key, ", ".join([repr((r.weight, r.str)) for r in self.data])
+        )
 
     def __str__(self):
-        string = self.key + ":"
-        for r in self:
-            string += "\n{:2} {}".format(r.weight, r)
-        return string
+        lines = ["{:2} {}".format(r.weight, r.str) for r in self.data]
+        lines.insert(0, self.key + ":")
+        return "\n".join(lines)
 
-    def sort(self, reverse=False, key=lambda rep: rep.weight):
+    def sort(self, reverse=False, key=_by_weight):
         """sort items by weight"""
         self.data.sort(key=key, reverse=reverse)
 
     def prune(self, reverse=False):
         """sort items and prune repeats"""
         self.sort(reverse)
-        repeats = []
         seen = set()
-        for i, rep in enumerate(self):
-            if rep.str in seen:
-                repeats.append(i)
-            seen.add(rep.str)
-        for i in repeats[::-1]:
-            del self.data[i]
+        data = []
+        for rep in self.data:
+            string = rep.str
+            if string not in seen:
+                seen.add(string)
+                data.append(rep)
+        self.data = data
 
     def __deepcopy__(self, memo=None):
         new = type(self)(self.keyparts)
@@ -336,22 +385,26 @@ class ReplacementList(abc.MutableSequence):
         """convert all weights to faux statistical values because my boss told
         me to.
         """
-        reciprocals = [1 / (rep.weight + 1) for rep in self]
+        reciprocals = [1 / (rep.weight + 1) for rep in self.data]
         total = sum(reciprocals)
-        data = [
-            StatRep(reciprocals[i] / total, keyvalue=rep.keyvalue)
-            for i, rep in enumerate(self)
-        ]
-        return StatRepList(self.keyparts, data)
+        return StatRepList._wrap(
+            self.keyparts,
+            [
+                StatRep(reciprocal / total, rep.keyvalue)
+                for reciprocal, rep in zip(reciprocals, self.data)
+            ],
+        )
 
 
 class StatRepList(ReplacementList):
+    __slots__ = ()
+
     def makestat(self):
         return self
 
-    def sort(self, reverse=False, key=lambda rep: rep):
-        reverse = not reverse
-        return super().sort(self, reverse, key)
+    def sort(self, reverse=False, key=_by_weight):
+        # higher statistical weights are better, so the default is reversed.
+        return super().sort(not reverse, key)
 
 
 _empty_rep = Replacement.new(0, "")
@@ -364,18 +417,32 @@ def add_rlists(rlists):
     if (n := math.prod([len(rl) for rl in rlists])) > 10000:
         raise CombinatorialExplosion(n)
 
+    # add_rs() and add_srs(), inlined. The product is built up one list at a
+    # time as (weight, keyvalue) pairs, so each combination extends its
+    # prefix instead of re-adding every part from scratch, and Replacements
+    # are only made for the final combinations.
     if any(isinstance(rl, StatRepList) for rl in rlists):
-        data = [rl.makestat().data for rl in rlists]
-        add = add_srs
-        t = StatRepList
-    else:
-        data = [rl.data for rl in rlists]
-        add = add_rs
-        t = ReplacementList
-    composite_values = [i for i in itertools.product(*data)]
-    for i, rs in enumerate(composite_values):
-        composite_values[i] = add(*rs)
-    return t.from_values(composite_values)
+        combos = [(1, ())]
+        for rl in rlists:
+            data = rl.makestat().data
+            combos = [
+                (weight * r.weight, keyvalue + r.keyvalue)
+                for weight, keyvalue in combos
+                for r in data
+            ]
+        data = [StatRep(weight, keyvalue) for weight, keyvalue in combos]
+        return StatRepList._wrap(data[0].keyparts, data)
+
+    combos = [(0, ())]
+    for rl in rlists:
+        data = rl.data
+        combos = [
+            (weight + r.weight, keyvalue + r.keyvalue)
+            for weight, keyvalue in combos
+            for r in data
+        ]
+    data = [Replacement(weight, keyvalue) for weight, keyvalue in combos]
+    return ReplacementList._wrap(data[0].keyparts, data)
 
 
 def unpack_keyparts(keytree):
@@ -403,7 +470,7 @@ class ReplacementKey(Trie):
         super().__setitem__(key, _ensurereplist(key, value, weight))
 
     def update(self, dictionary, weight=None):
-        for k, v in dictionary.items():
+        for k, v in sorted(dictionary.items(), key=self._treeorder):
             self.__setitem__(k, v, weight)
 
     def extend(self, dictionary, weight=None):
@@ -430,7 +497,11 @@ class ReplacementKey(Trie):
         if type(self) is type(child):
             child = self.copy()
         else:
-            child.update(copy.deepcopy(self.dict()))
+            # the keys are laid out in the opposite direction, so the items
+            # have to be inserted again. Only the values need copying.
+            memo: dict = {}
+            deepcopy = copy.deepcopy
+            child.update({k: deepcopy(v, memo) for k, v in self.items()})
         for d in dicts:
             child.update(d, weight)
         return child
@@ -461,12 +532,13 @@ class CharSets:
     lists based on patterns.
     """
 
-    __slots__ = "parsed", "unparsed", "key"
+    __slots__ = "parsed", "unparsed", "key", "_search"
 
     def __init__(self, char_sets, key):
-        self.unparsed = Trie(char_sets)
+        self.unparsed = Trie(char_sets).freeze()
         self.parsed = Trie()
         self.key = key
+        self._search = None
 
     def __getitem__(self, key):
         try:
@@ -484,19 +556,49 @@ class CharSets:
     def __iter__(self):
         return iter(self.unparsed)
 
+    def in_pattern(self, key):
+        """True if any character set name occurs in `key`"""
+        if self._search is None:
+            # longest names first, so the alternation doesn't stop early.
+            names = sorted(self.unparsed, key=len, reverse=True)
+            # with no names, "(?!)" stands in for the empty alternation, which
+            # would match every key.
+            pattern = "|".join(map(re.escape, names)) or "(?!)"
+            self._search = re.compile(pattern).search
+        return self._search(key) is not None
+
+    def _match(self, key, start):
+        """match a character set name in `key` at index `start`, parsing its
+        definition on first use. returns the same as Trie.match_prefix()
+        """
+        match = self.parsed.match_prefix(key, start)
+        if match is None:
+            match = self.unparsed.match_prefix(key, start)
+            if match is None:
+                return None
+            self.conf_parse(key[start : match[1]])
+            match = self.parsed.match_prefix(key, start)
+        return match
+
     def getpart(self, key):
         """wrapper on getpart from the internal Trie, used to tokenize pattern
         strings by CharSets.parse_pattern()
         """
-        try:
-            return self.parsed.getpart(key)
-        except KeyError:
-            _, remainder = self.unparsed.getpart(key)
-            matched = key[: len(key) - len(remainder)]
-            self.conf_parse(matched)
-        return self.parsed.getpart(key)
+        match = self._match(key, 0)
+        if match is None:
+            raise KeyError(key)
+        return match[0], key[match[1] :]
 
-    getallparts = Trie.getallparts
+    def getallparts(self, key):
+        results = []
+        i = 0
+        while i < len(key):
+            match = self._match(key, i)
+            if match is None:
+                raise KeyError(key[i:])
+            value, i = match
+            results.append(value)
+        return results
 
     def parse_pattern(self, key):
         """tokenizes a pattern-based replacement definition and returns a
@@ -506,18 +608,19 @@ class CharSets:
         index in the results list.
         """
         results = []
-        remainder = key
+        i = 0
         counter = 0
         index = {}
-        while remainder:
-            try:
-                value, remainder = self.getpart(remainder)
+        while i < len(key):
+            match = self._match(key, i)
+            if match is None:
+                value = key[i]
+                i += 1
+                index[value] = len(results)
+            else:
+                value, i = match
                 counter += 1
                 index[counter] = len(results)
-            except KeyError:
-                value = remainder[0]
-                remainder = remainder[1:]
-                index[value] = len(results)
             results.append(value)
         return results, index
 
@@ -572,9 +675,16 @@ class KeyGenerator:
     def __init__(self, profile, base_key="base"):
         self.base_key = base_key
         self.keys = {}
-        # profile is static. prof2 is modified while the keys are generated
+        # profile is static. prof2 is modified while the keys are generated.
+        # Rather than deep-copying the whole profile up front, prof2 shares
+        # its groups until one of them is about to change (see _unshare).
         self.profile = profile
-        self.prof2 = copy.deepcopy(self.profile)
+        self.prof2 = dict(profile)
+        self._shared = {id(v) for v in profile.values() if isinstance(v, dict)}
+        if "keys" in profile:
+            # normalize_profile rewrites this section in place.
+            self._shared.discard(id(profile["keys"]))
+            self.prof2["keys"] = copy.deepcopy(profile["keys"])
         self.normalize_profile()
         self.broken = profile.get("broken_clusters")
         if "char_sets" in profile:
@@ -590,6 +700,8 @@ class KeyGenerator:
                 if k == base_key or k in self.keys:
                     continue
                 self.keygen(k)
+        for key in self.keys.values():
+            key.freeze()
 
     def __setitem__(self, key, value):
         self.keys[key] = value
@@ -597,6 +709,38 @@ class KeyGenerator:
     def __getitem__(self, key):
         return self.keys[key]
 
+    def serializable(self):
+        """the generated keys as JSON serializable types. Each key is stored
+        with a flag for whether it matches from the end, and its replacements
+        are reduced to their weights and strings, as in
+        ReplacementKey.simplify().
+        """
+        return {
+            name: [isinstance(key, ReplacementBackKey), key.simplify()]
+            for name, key in self.keys.items()
+        }
+
+    @classmethod
+    def from_serializable(cls, data, base_key="base"):
+        """rebuild the keys from the output of serializable(). The new
+        instance only has the keys, not the profile they were generated from.
+        """
+        new = cls.__new__(cls)
+        new.base_key = base_key
+        new.keys = {}
+        for name, (backwards, simplified) in data.items():
+            key = ReplacementBackKey() if backwards else ReplacementKey()
+            key.update(
+                {
+                    k: ReplacementList._wrap(
+                        (k,), [Replacement(w, ((k, v),)) for w, v in values]
+                    )
+                    for k, values in simplified.items()
+                }
+            )
+            new.keys[name] = key.freeze()
+        return new
+
     def normalize_profile(self):
         """There are shortcuts for leaving implied keys out of the profile
         definitions. This normalizes out those shortcuts.
@@ -612,13 +756,31 @@ class KeyGenerator:
         return iter(self.keys)
 
     def keygen(self, keyname):
-        """generates a key from the `keys` section of a profile."""
+        """generates a key from the `keys` section of a profile, after any of
+        its parents which haven't been generated yet.
+        """
+        chain = [keyname]
+        parent = self._parent(keyname)
+        while parent is not None and parent not in self.keys:
+            if parent in chain:
+                raise KeyGeneratorError(
+                    "circular parents for key %r: %s"
+                    % (keyname, " -> ".join(chain + [parent]))
+                )
+            chain.append(parent)
+            parent = self._parent(parent)
+        for name in reversed(chain):
+            self._keygen(name)
+
+    def _parent(self, keyname):
+        info = self.profile["keys"][keyname]
+        return info.get("parent", None if keyname == self.base_key else self.base_key)
+
+    def _keygen(self, keyname):
         info = self.profile["keys"][keyname]
         suffix = info.get("suffix")
-        parent = info.get("parent", None if keyname == self.base_key else self.base_key)
+        parent = self._parent(keyname)
         groups = info.get("groups", [])
-        if parent not in self.keys and parent is not None:
-            self.keygen(parent)
         self.new(keyname, parent=parent, suffix=suffix)
         for g in groups:
             if isinstance(g, str):
@@ -649,11 +811,12 @@ class KeyGenerator:
         char_set aliases will be expanded.
         """
         for g in profile_groups:
-            if isinstance(g, str):
+            from_prof2 = isinstance(g, str)
+            if from_prof2:
                 g = self.prof2[g]
             profile_updates = []
             for k, v in g.items():
-                if any(i in k for i in self.char_sets):
+                if self.char_sets and self.char_sets.in_pattern(k):
                     generated = self.patterngen(k, v, broken_clusters=self.broken)
                     self[key_name].extend(generated, weight)
                     profile_updates.append((k, generated))
@@ -661,28 +824,50 @@ class KeyGenerator:
                     self[key_name].setdefault(k, ReplacementList.new(k)).extend(
                         _ensurereplist(k, v, weight)
                     )
-            for key, generated in profile_updates:
-                del g[key]
-                g.update(generated)
+            self._replace_patterns(g, profile_updates, from_prof2)
 
     def update(self, key_name, *profile_groups, weight=None):
         """update a key with the specified profile groups. Keys containing
         char_set aliases will be expanded.
         """
         for g in profile_groups:
-            if isinstance(g, str):
+            from_prof2 = isinstance(g, str)
+            if from_prof2:
                 g = self.prof2[g]
             profile_updates = []
             for k, v in g.items():
-                if any(i in k for i in self.char_sets):
+                if self.char_sets and self.char_sets.in_pattern(k):
                     generated = self.patterngen(k, v, broken_clusters=self.broken)
                     self[key_name].update(generated, weight)
                     profile_updates.append((k, generated))
                 else:
                     self[key_name].__setitem__(k, v, weight)
-            for key, generated in profile_updates:
-                del g[key]
-                g.update(generated)
+            self._replace_patterns(g, profile_updates, from_prof2)
+
+    def _replace_patterns(self, group, profile_updates, from_prof2):
+        """swap the generated replacements for the patterns they came from in
+        a profile group, so they aren't generated again. A group which prof2
+        still shares with profile is copied first, and whichever side the
+        group came from gets the change.
+        """
+        if not profile_updates:
+            return
+        if id(group) in self._shared:
+            copied = self._unshare(group)
+            if from_prof2:
+                group = copied
+        for key, generated in profile_updates:
+            del group[key]
+            group.update(generated)
+
+    def _unshare(self, group):
+        """give prof2 its own copy of a group it still shares with profile"""
+        self._shared.discard(id(group))
+        copied = dict(group)
+        for name, value in self.prof2.items():
+            if value is group:
+                self.prof2[name] = copied
+        return copied
 
     def patterngen(self, key_pattern, rep_patterns, weight=0, broken_clusters=None):
         """implement some kind of pattern-based replacement generation for
@@ -694,61 +879,64 @@ class KeyGenerator:
             rep_patterns = [rep_patterns]
         rep_patterns = self._normalize_rp([self._parse_rep(i) for i in rep_patterns])
         generated = {}
+        templates = None
         for keyparts in itertools.product(*blocks):
+            if templates is None:
+                templates = self._rep_templates(
+                    key_pattern, blocks, pattern_idx, rep_patterns
+                )
             replist = ReplacementList(unpack_keyparts(keyparts), broken=self.broken)
             generated[replist.key] = replist
-            for i, rep_group in enumerate(rep_patterns):
-                reps = []
-                for j, block in enumerate(rep_group):
-                    if isinstance(block, int):
-                        try:
-                            reps.append(keyparts[pattern_idx[block]])
-                        except KeyError:
-                            raise PatternError(
-                                "found reference to capture-group %s, but "
-                                "there aren't that many capture groups in "
-                                "pattern %r" % (block, key_pattern)
-                            )
-                    else:
-                        try:
-                            if not isinstance(blocks[j], str):
-                                reps.append(
-                                    ReplacementList.new(
-                                        "", [(i, block)], broken=self.broken
-                                    )
-                                )
-                            else:
-                                reps.append(
-                                    ReplacementList.new(
-                                        blocks[j],
-                                        [(i, block)],
-                                        broken=self.broken,
-                                    )
-                                )
-                        except IndexError:
-                            reps.append(
-                                ReplacementList.new(
-                                    "", [(i, block)], broken=self.broken
-                                )
-                            )
-                replacement = add_rlists(reps)
-                replist.extend(replacement.data, weight)
+            for parts, refs in templates:
+                reps = parts.copy()
+                for pos, idx in refs:
+                    reps[pos] = keyparts[idx]
+                replist.extend(add_rlists(reps).data, weight)
 
         return generated
 
+    def _rep_templates(self, key_pattern, blocks, pattern_idx, rep_patterns):
+        """prepare the parts of each replacement pattern which are the same
+        for every combination patterngen() produces. Each template is a list
+        of parts, where literal strings are ReplacementLists built only once,
+        and a list of (position, block index) pairs saying where the blocks of
+        each combination go for the capture groups.
+        """
+        templates = []
+        for i, rep_group in enumerate(rep_patterns):
+            template = []
+            refs = []
+            for j, block in enumerate(rep_group):
+                if isinstance(block, int):
+                    try:
+                        refs.append((j, pattern_idx[block]))
+                        template.append(None)
+                    except KeyError:
+                        raise PatternError(
+                            "found reference to capture-group %s, but "
+                            "there aren't that many capture groups in "
+                            "pattern %r" % (block, key_pattern)
+                        )
+                else:
+                    try:
+                        key = blocks[j] if isinstance(blocks[j], str) else ""
+                    except IndexError:
+                        key = ""
+                    template.append(
+                        ReplacementList.new(key, [(i, block)], broken=self.broken)
+                    )
+            templates.append((template, refs))
+        return templates
+
     @staticmethod
     def _parse_rep(rep):
         """parse the replacement pattern"""
-        results = []
-        remainder = rep
-        while remainder:
-            try:
-                value, remainder = esc_numbs.getpart(remainder)
-            except KeyError:
-                value = remainder[0]
-                remainder = remainder[1:]
-            results.append(value)
-        return results
+        if not isinstance(rep, str):
+            return list(rep)
+        return [
+            token if len(token) == 1 else _rep_escapes[token]
+            for token in _rep_tokens(rep)
+        ]
 
     @staticmethod
     def _normalize_rp(rep_pats):
@@ -807,14 +995,15 @@ class KeyGenerator:
             raise TypeError('%s is not supported as "base" argument.' % type(base))
 
 
-# Just another Trie for parsing regex-like capture group syntax for
-# substitutions.
-esc_numbs = Trie()
+# for parsing regex-like capture group syntax in substitutions: a backslash
+# and a digit refer to a capture group, and a second backslash escapes that.
+# The pattern is compiled once and splits a replacement in a single pass.
+_rep_tokens = re.compile(r"\\\\[1-9]|\\[1-9]|.", re.DOTALL).findall
+_rep_escapes = {}
 for i in range(1, 10):
-    s = str(i)
-    esc_numbs["\\" + s] = i
-    esc_numbs["\\\\" + s] = "\\" + s
-del s, i
+    _rep_escapes["\\" + str(i)] = i
+    _rep_escapes["\\\\" + str(i)] = "\\" + str(i)
+del i
 _empty_replist = ReplacementList.new("", [""])
 
 
@@ -0,0 +1,31 @@
+"""write precompiled copies of schemas next to their YAML files, so loading
+them doesn't require parsing YAML:
+
+    python -m deromanize.precompile [SCHEMA.yml ...]
+
+Without arguments, the schemas from the user's configuration (or the ones
+bundled with deromanize) are compiled.
+"""
+import sys
+from pathlib import Path
+from .config import Config, write_sidecar
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        paths = [Path(arg) for arg in argv]
+    else:
+        paths = list(Config().schemas.values())
+    failed = False
+    for path in paths:
+        if write_sidecar(path):
+            print(path)
+        else:
+            print("could not write a copy of %s" % path, file=sys.stderr)
+            failed = True
+    return int(failed)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
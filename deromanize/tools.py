@@ -1,53 +1,85 @@
 import json
 import os
 import pathlib
+import re
+import threading
 import libaaron
 from .keygenerator import KeyGenerator, ReplacementList, add_rlists
 
+try:
+    # its JSONDecodeError subclasses the one in json.
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
-def cached_keys(
-    loader, profile_file, cache_path, base_key="base", tree_cache=False
-):
-    stats = os.stat(profile_file.name)
+try:
+    from xxhash import xxh3_64 as profile_hash
+except ImportError:
+    from hashlib import blake2b as profile_hash
+
+
+def profile_digest(path) -> str:
+    """hash of a profile file's contents, which decides whether its cached
+    keys are still good. The mtime alone can't be trusted for that; some
+    systems give every file the same one.
+    """
+    with open(path, "rb") as fh:
+        return profile_hash(fh.read()).hexdigest()
+
+
+def cached_keys(loader, profile_file, cache_path, base_key="base"):
+    """build the keys for the profile in `profile_file` with `loader`, or
+    recall them from `cache_path` if they were cached from the same profile.
+    Recalled replacements only keep their weights and strings.
+    """
+    digest = profile_digest(profile_file.name)
     cache_path = pathlib.Path(cache_path)
-    if not cache_path.exists():
-        with cache_path.open("w", encoding="utf8") as cache:
-            cache.write("0")
-    cache_file = cache_path.open(encoding="utf8")
-    cached_mtime = float(cache_file.readline())
-    if stats.st_mtime == cached_mtime:
+    # the first line of the cache is the digest of the profile it was made
+    # from, and the second is the serialized keys.
+    try:
+        with cache_path.open(encoding="utf8") as cache_file:
+            cached_digest = cache_file.readline().rstrip("\n")
+            cached = cache_file.readline() if cached_digest == digest else None
+    except FileNotFoundError:
+        cached = None
+    if cached is not None:
         try:
-            return KeyGenerator(
-                json.loads(cache_file.readline()),
-                base_key=base_key,
-                mtime=stats.st_mtime,
-                from_cache=True,
-                tree_cache=tree_cache,
+            return KeyGenerator.from_serializable(
+                json_loads(cached), base_key=base_key
             )
-            cache_file.close()
         except json.JSONDecodeError:
-            cache_file.close()
             os.remove(cache_path)
             raise
     else:
-        cache_file.close()
-        key = KeyGenerator(
-            loader(profile_file),
-            base_key=base_key,
-            mtime=stats.st_mtime,
-            tree_cache=tree_cache,
-        )
-        pid = os.fork()
-        if pid == 0:
-            cache_writer(cache_path, key)
-            os._exit(0)
-        else:
-            return key
-
-
-def cache_writer(path, key):
-    with path.open("w", encoding="utf8") as cache:
-        key.serialize(cache, ensure_ascii=False, separators=(",", ":"))
+        key = KeyGenerator(loader(profile_file), base_key=base_key)
+        # the keys are reduced to plain data here, so changes made to them
+        # later can't end up in the cache. Encoding and writing that happens
+        # in the background. The thread isn't a daemon, so the interpreter
+        # waits for it at exit instead of killing it halfway through the file.
+        threading.Thread(
+            target=cache_writer, args=(cache_path, key.serializable(), digest)
+        ).start()
+        return key
+
+
+def cache_writer(path, data, digest):
+    # written under a temporary name and moved into place, so a reader never
+    # sees a half-written cache, even if the process exits mid-write. The
+    # name is unique to each writer, including threads of the same process.
+    tmp = path.with_name(
+        "%s.%d.%d.tmp" % (path.name, os.getpid(), threading.get_ident())
+    )
+    try:
+        with tmp.open("w", encoding="utf8") as cache:
+            cache.write(digest + "\n")
+            json.dump(data, cache, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            tmp.unlink()
+        except OSError:
+            pass
+        raise
 
 
 def front_mid_end_decode(keys, word):
@@ -87,7 +119,7 @@ def _no_end(keys, word):
     if remainder:
         end, remainder = keys["end"].getpart(remainder)
         if remainder:
-            middle = keys["mid"].getallparts(remainder).add()
+            middle = add_rlists(keys["mid"].getallparts(remainder))
             return front + middle + end
         else:
             return front + end
@@ -110,27 +142,22 @@ def stripper_factory(*wordgroups, dict_func=None):
         for c in string
     }
 
-    def strip(word):
-        """remove non-character symbols from the front of a word. return a tuple
-        containing the junk from the front, and the remainder of the word.
-        """
-        junk = []
-        remainder = ""
-        for i, char in enumerate(word):
-            if char in chars:
-                remainder = word[i:]
-                break
-            junk.append(char)
-
-        return ("".join(junk), remainder) if remainder else ("", "".join(junk))
+    if not chars:
+        return lambda word: ("", word, "")
+    # the front is everything before the first character in `chars`, the word
+    # runs to the last one, and the back is whatever follows it.
+    char_class = "".join([re.escape(c) for c in sorted(chars)])
+    match = re.compile("([^%s]*)(.*[%s])?" % (char_class, char_class), re.DOTALL).match
 
     def double_strip(word):
         """strip non-character symbols off the front and back of a word. return
         a tuple with (extra stuff from the front, word, extra stuff from the
         back)
         """
-        front_junk, remainder = strip(word)
-        back_junk, stripped_word = [i[::-1] for i in strip(remainder[::-1])]
-        return front_junk, stripped_word, back_junk
+        m = match(word)
+        stripped_word = m[2]
+        if stripped_word is None:
+            return "", word, ""
+        return m[1], stripped_word, word[m.end() :]
 
     return double_strip
@@ -22,6 +22,27 @@ from collections import abc
 from typing import Optional
 
 
+class TrieNode:
+    """a node in a Trie. `value` is ... (Ellipsis) if no key ends at this
+    node, since None is a perfectly good value. `children` maps each next
+    character to its node.
+    """
+
+    __slots__ = "value", "children"
+
+    def __init__(self, value=...):
+        self.value = value
+        self.children = {}
+
+    def __eq__(self, other):
+        if not isinstance(other, TrieNode):
+            return NotImplemented
+        return self.value == other.value and self.children == other.children
+
+    def __repr__(self):
+        return "%s(%r, %r)" % (self.__class__.__name__, self.value, self.children)
+
+
 class Trie:
     """a prefix tree for dealing with transliteration standards with digraphs.
     This could just be a dictionary if there weren't digraphs in
@@ -32,7 +53,7 @@ class Trie:
     methods for use with transliteration stuff.
     """
 
-    __slots__ = "root", "_len"
+    __slots__ = "root", "_len", "_flat"
 
     def __init__(self, initializer=None):
         """Trie([initializer])
@@ -41,16 +62,20 @@ class Trie:
         the same way it is used to create a dictionary (argument should be a
         dictionary or an iterable with two-tuples.
         """
-        self.root = [..., {}]
+        self.root = TrieNode()
         self._len = 0
+        self._flat = None
         if initializer is not None:
             self.update(initializer)
 
     def clear(self):
-        self.root[1].clear()
+        self._flat = None
+        self._len = 0
+        self.root.value = ...
+        self.root.children.clear()
 
     def __bool__(self):
-        return bool(self.root[1])
+        return bool(self.root.children)
 
     def __eq__(self, other):
         return self.items() == other.items()
@@ -59,9 +84,13 @@ class Trie:
         return self.items() != other.items()
 
     def _mknode(self, key):
+        self._flat = None
         node = self.root
         for char in key:
-            node = node[1].setdefault(char, [..., {}])
+            children = node.children
+            node = children.get(char)
+            if node is None:
+                node = children[char] = TrieNode()
         return node
 
     def __setitem__(self, key: str, value):
@@ -69,37 +98,45 @@ class Trie:
         create a new endpoint.
         """
         node = self._mknode(key)
-        if node[0] is ...:
+        if node.value is ...:
             self._len += 1
-        node[0] = value
+        node.value = value
 
     def setdefault(self, key, default=None):
         node = self._mknode(key)
-        if node[0] is ...:
+        if node.value is ...:
             self._len += 1
-            node[0] = default
+            node.value = default
             return default
 
-        return node[0]
+        return node.value
 
     def update(self, mapping):
-        for k, v in mapping.items():
+        """add all items from `mapping`. Keys are inserted in the order they
+        are laid out in the tree, so consecutive inserts walk the nodes of
+        their shared prefix.
+        """
+        for k, v in sorted(mapping.items(), key=self._treeorder):
             self[k] = v
 
+    @staticmethod
+    def _treeorder(item):
+        return item[0]
+
     def _getnode(self, key: str):
         """get a node out of the internal prefix tree. An implementation
         detail.
         """
         node = self.root
         for char in key:
-            node = node[1][char]
+            node = node.children[char]
         return node
 
     def __getitem__(self, key: str):
         node = self._getnode(key)
-        if node[0] is ...:
+        if node.value is ...:
             raise KeyError(key)
-        return node[0]
+        return node.value
 
     def get(self, key: str, default):
         try:
@@ -117,6 +154,24 @@ class Trie:
     def __repr__(self):
         return "%s(%r)" % (self.__class__.__name__, self.dict())
 
+    def freeze(self):
+        """build a flat copy of the tree for faster lookups with getpart().
+        Nodes are numbered and stored in two parallel lists, one with a
+        dictionary mapping each child character to the number of the child
+        node and one with the node values. Modifying the trie throws the flat
+        copy away again, so freeze() should be called once the trie is built.
+        """
+        nodes = [self.root]
+        children = []
+        for node in nodes:
+            kids = {}
+            for char, child in node.children.items():
+                kids[char] = len(nodes)
+                nodes.append(child)
+            children.append(kids)
+        self._flat = children, [node.value for node in nodes]
+        return self
+
     def getstack(self, key: str):
         """given a key, return a tuple containing the final node along with a
         stack of all the parent nodes (starting from the root). This stack is a
@@ -130,21 +185,22 @@ class Trie:
         stack = []
         for char in key:
             stack.append((node, char))
-            node = node[1][char]
+            node = node.children[char]
         return node, stack
 
     def pop(self, key: str):
         node, stack = self.getstack(key)
-        val = node[0]
+        val = node.value
         if val is ...:
             raise KeyError(key)
+        self._flat = None
         self._len -= 1
-        node[0] = ...
+        node.value = ...
 
         for parent, key in reversed(stack):
-            node = parent[1][key]
-            if node[0] is ... and not node[1]:
-                del parent[1][key]
+            node = parent.children[key]
+            if node.value is ... and not node.children:
+                del parent.children[key]
             else:
                 break
         return val
@@ -175,8 +231,8 @@ class Trie:
         "prefix" argument is provided, yield all keys and values where the key
         starts with "prefix".
 
-        This method traverses the tree structure with call-stack recursion, so
-        it isn't the cheapest thing ever, on the other hand, it's lazy, so, eh.
+        The tree is walked lazily with an explicit stack, so the order is the
+        same as a depth-first, pre-order traversal.
         """
         if prefix:
             topnode = self._getnode(prefix)
@@ -187,14 +243,35 @@ class Trie:
         return self._itemize(topnode, keypart)
 
     def _itemize(self, topnode, keypart: str = ""):
-        """traverse the tree recursively and get spit out the non-empty nodes
-        along the way.
+        """traverse the tree and spit out the non-empty nodes along the way.
+        Each level of the stack holds the key leading to a node and an
+        iterator over its children.
         """
-        for key, node in topnode[1].items():
-            newkeypart = keypart + key
-            if node[0] is not ...:
-                yield (newkeypart, node[0])
-            yield from self._itemize(node, newkeypart)
+        stack = [(keypart, iter(topnode.children.items()))]
+        while stack:
+            keypart, children = stack[-1]
+            for key, node in children:
+                newkeypart = keypart + key
+                if node.value is not ...:
+                    yield (newkeypart, node.value)
+                if node.children:
+                    stack.append((newkeypart, iter(node.children.items())))
+                    break
+            else:
+                stack.pop()
+
+    def _values(self, topnode):
+        """like _itemize, but without building the keys."""
+        stack = [iter(topnode.children.values())]
+        while stack:
+            for node in stack[-1]:
+                if node.value is not ...:
+                    yield node.value
+                if node.children:
+                    stack.append(iter(node.children.values()))
+                    break
+            else:
+                stack.pop()
 
     def keys(self, prefix: Optional[str] = None):
         """Return an generator (not a dict view!) with all keys. optional
@@ -210,7 +287,9 @@ class Trie:
         `prefix` argument limits results to keys beginning with the given
         prefix.
         """
-        return (v for _, v in self.items(prefix))
+        if prefix:
+            return self._values(self._getnode(prefix))
+        return self._values(self.root)
 
     def __len__(self):
         return self._len
@@ -221,7 +300,24 @@ class Trie:
         that it's not the cheapest operation.
         """
         new = type(self)()
-        new.root = copy.deepcopy(self.root)
+        # the nodes are rebuilt directly, which is a lot quicker than having
+        # deepcopy() work out the structure. Values are still deep-copied,
+        # sharing one memo so that shared values stay shared.
+        memo: dict = {}
+        deepcopy = copy.deepcopy
+        stack = [(self.root, new.root)]
+        while stack:
+            node, newnode = stack.pop()
+            children = newnode.children
+            for char, child in node.children.items():
+                value = child.value
+                if value is not ...:
+                    value = deepcopy(value, memo)
+                children[char] = newchild = TrieNode(value)
+                if child.children:
+                    stack.append((child, newchild))
+        if self.root.value is not ...:
+            new.root.value = deepcopy(self.root.value, memo)
         new._len = self._len
         return new
 
@@ -235,46 +331,120 @@ class Trie:
         """takes a key and matches as much of it as possible. returns a tuple
         containing the value of the node and the remainder of the key.
         """
+        if self._flat is not None:
+            return self._flatpart(key)
         node = self.root
         value = ...
         remainder = key
         for i, char in enumerate(key):
             try:
-                node = node[1][char]
+                node = node.children[char]
             except KeyError:
                 break
 
-            if node[0] is not ...:
-                value, remainder = node[0], key[i + 1 :]
+            if node.value is not ...:
+                value, remainder = node.value, key[i + 1 :]
 
         if value is ...:
             raise KeyError(key)
         else:
             return value, remainder
 
+    def _flatpart(self, key: str):
+        """getpart() for a frozen trie."""
+        children, values = self._flat
+        i = 0
+        value = ...
+        end = 0
+        for pos, char in enumerate(key, 1):
+            i = children[i].get(char)
+            if i is None:
+                break
+            if values[i] is not ...:
+                value = values[i]
+                end = pos
+
+        if value is ...:
+            raise KeyError(key)
+        return value, key[end:]
+
+    def match_prefix(self, key: str, start: int = 0):
+        """like getpart(), but matches `key` from index `start` without
+        slicing it. returns a tuple of the value and the index where the match
+        ends, or None if nothing matches.
+        """
+        value = end = None
+        if self._flat is not None:
+            children, values = self._flat
+            node = 0
+            for pos in range(start, len(key)):
+                node = children[node].get(key[pos])
+                if node is None:
+                    break
+                if values[node] is not ...:
+                    value, end = values[node], pos + 1
+        else:
+            node = self.root
+            for pos in range(start, len(key)):
+                node = node.children.get(key[pos])
+                if node is None:
+                    break
+                if node.value is not ...:
+                    value, end = node.value, pos + 1
+        if end is None:
+            return None
+        return value, end
+
     def getallparts(self, key: str):
         """loop over a string, splitting the input string up by longest
         possible matches.
         """
+        return self._walkparts(key)
+
+    def _walkparts(self, key: str):
+        """does the work for getallparts(). Each token is found by walking
+        from its start index, so the remainder of the string is never copied.
+        """
+        root = self.root
         results = []
-        remainder = key
-        while remainder:
-            value, remainder = self.getpart(remainder)
+        start = 0
+        length = len(key)
+        while start < length:
+            node = root
+            value = ...
+            end = start
+            for i in range(start, length):
+                node = node.children.get(key[i])
+                if node is None:
+                    break
+                if node.value is not ...:
+                    value, end = node.value, i + 1
+            if value is ...:
+                raise KeyError(key[start:])
             results.append(value)
+            start = end
         return results
 
     def serializable(self):
-        root = self.copy().root
-        self._put_none(root)
+        """the tree as nested [value, children] lists, with None in place of
+        missing values, for formats that only know about lists and dicts.
+        """
+        memo: dict = {}
+        deepcopy = copy.deepcopy
+        value = self.root.value
+        root = [None if value is ... else deepcopy(value, memo), {}]
+        stack = [(self.root, root)]
+        while stack:
+            node, newnode = stack.pop()
+            children = newnode[1]
+            for char, child in node.children.items():
+                value = child.value
+                value = None if value is ... else deepcopy(value, memo)
+                children[char] = newchild = [value, {}]
+                if child.children:
+                    stack.append((child, newchild))
         return root
 
-    def _put_none(self, node):
-        if node[0] is ...:
-            node[0] = None
-        for node in node[1].values():
-            self._put_none(node)
-
-
 abc.MutableMapping.register(Trie)
 
 
@@ -285,21 +455,107 @@ class BackTrie(Trie):
 
     __slots__ = ()
 
+    @staticmethod
+    def _treeorder(item):
+        return item[0][::-1]
+
+    # keys are stored reversed in the tree. Walking them with reversed() or
+    # negative indexes avoids making a reversed copy of each key.
     def _mknode(self, key: str):
-        return super()._mknode(key[::-1])
+        return super()._mknode(reversed(key))
 
     def _getnode(self, key: str):
-        return super()._getnode(key[::-1])
+        return super()._getnode(reversed(key))
 
     def getstack(self, key: str):
-        return super().getstack(key[::-1])
+        return super().getstack(reversed(key))
 
     def getpart(self, key: str):
-        value, remainder = super().getpart(key[::-1])
-        return value, remainder[::-1]
+        if self._flat is not None:
+            return self._flatpart(key)
+        node = self.root
+        value = ...
+        end = len(key)
+        for i in range(len(key) - 1, -1, -1):
+            node = node.children.get(key[i])
+            if node is None:
+                break
+            if node.value is not ...:
+                value, end = node.value, i
+
+        if value is ...:
+            raise KeyError(key)
+        return value, key[:end]
+
+    def _flatpart(self, key: str):
+        children, values = self._flat
+        node = 0
+        value = ...
+        end = len(key)
+        for i in range(len(key) - 1, -1, -1):
+            node = children[node].get(key[i])
+            if node is None:
+                break
+            if values[node] is not ...:
+                value = values[node]
+                end = i
+
+        if value is ...:
+            raise KeyError(key)
+        return value, key[:end]
+
+    def match_prefix(self, key: str, start: Optional[int] = None):
+        """like getpart(), but matches the part of `key` which ends at index
+        `start` (by default, the end of the key) without slicing it. returns a
+        tuple of the value and the index where the match begins, or None if
+        nothing matches.
+        """
+        if start is None:
+            start = len(key)
+        value = begin = None
+        if self._flat is not None:
+            children, values = self._flat
+            node = 0
+            for pos in range(start - 1, -1, -1):
+                node = children[node].get(key[pos])
+                if node is None:
+                    break
+                if values[node] is not ...:
+                    value, begin = values[node], pos
+        else:
+            node = self.root
+            for pos in range(start - 1, -1, -1):
+                node = node.children.get(key[pos])
+                if node is None:
+                    break
+                if node.value is not ...:
+                    value, begin = node.value, pos
+        if begin is None:
+            return None
+        return value, begin
 
     def items(self, key: Optional[str] = None):
         return ((k[::-1], v) for k, v in super().items(key))
 
+    def _walkparts(self, key: str):
+        root = self.root
+        results = []
+        start = len(key)
+        while start:
+            node = root
+            value = ...
+            end = start
+            for i in range(start - 1, -1, -1):
+                node = node.children.get(key[i])
+                if node is None:
+                    break
+                if node.value is not ...:
+                    value, end = node.value, i
+            if value is ...:
+                raise KeyError(key[:start])
+            results.append(value)
+            start = end
+        return results
+
     def getallparts(self, key: str):
         return super().getallparts(key)[::-1]
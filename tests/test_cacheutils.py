@@ -0,0 +1,128 @@
+from deromanize import cacheutils
+import pytest
+
+
+@pytest.fixture
+def dbcache():
+    db = cacheutils.DBWrapper("sqlite://")
+    return db.mkcache("new", seed={"qore": {"קורה": 5, "קורא": 2}})
+
+
+def test_seed(dbcache):
+    assert dbcache["qore"] == {"קורה": 5, "קורא": 2}
+
+
+def test_add_many(dbcache):
+    dbcache.add_many(
+        [("qore", "קורה", 1), ("sefer", "ספר", 2), ("sefer", "ספר", 1)]
+    )
+    assert dbcache["qore", "קורה"] == 6
+    assert dbcache["sefer"] == {"ספר": 3}
+    dbcache.add("sefer", "ספר")
+    assert dbcache["sefer", "ספר"] == 4
+
+
+def test_missing_pair(dbcache):
+    with pytest.raises(KeyError):
+        dbcache["qore", "ספר"]
+    assert dbcache.get(("qore", "ספר")) is None
+
+
+def test_buffered_add(dbcache):
+    dbcache.add("shalom", "שלום")
+    dbcache.add("shalom", "שלום", 2)
+    assert dbcache._pending == {("shalom", "שלום"): 3}
+    assert dbcache.db.get("שלום", "shalom", "new")[0].count == 3
+    assert not dbcache._pending
+    assert dbcache["shalom", "שלום"] == 3
+    with pytest.raises(ValueError):
+        with dbcache:
+            dbcache.add("shalom", "שלום")
+            raise ValueError
+    assert dbcache["shalom"] == {}
+
+
+def test_dense_cache():
+    rows = [("qore", "קורה", 5), ("qore", "קורא", 2), ("qore", "קורה", 1)]
+    cache = cacheutils.CacheObject()
+    dense = cacheutils.DenseCacheObject()
+    cache.update(rows)
+    dense.update(rows)
+    assert list(dense) == list(cache)
+    assert dense["qore"] == cache["qore"]
+    assert dense["qore", "קורה"] == 6
+    assert dense.inverted().serializable() == cache.inverted().serializable()
+
+
+def test_rollback_forgets_ids(dbcache):
+    db = dbcache.db
+    with pytest.raises(ValueError):
+        with db:
+            db.add_many([("ספר", "sefer", "new", 1)])
+            raise ValueError
+    db.add_many([("ספר", "sefer", "new", 1)])
+    assert dbcache["sefer", "ספר"] == 1
+
+
+def test_without_upsert(monkeypatch):
+    # stands in for a database which has no INSERT ... ON CONFLICT
+    monkeypatch.delitem(cacheutils.UPSERT_INSERTS, "sqlite")
+    db = cacheutils.DBWrapper("sqlite://")
+    cache = db.mkcache("new", seed={"qore": {"קורה": 5, "קורא": 2}})
+    cache.add_many(
+        [("qore", "קורה", 1), ("sefer", "ספר", 2), ("sefer", "ספר", 1)]
+    )
+    assert cache["qore"] == {"קורה": 6, "קורא": 2}
+    assert cache["sefer"] == {"ספר": 3}
+
+
+def test_commit_through_wrapper(tmp_path):
+    url = "sqlite:///" + str(tmp_path / "cache.db")
+    db = cacheutils.DBWrapper(url)
+    cache = db.mkcache("new")
+    other = db.mkcache("new")
+    with db:
+        cache.add("shalom", "שלום")
+        assert other["shalom"] == {"שלום": 1}
+        cache.add("shalom", "שלום")
+    assert cacheutils.DBWrapper(url).mkcache("new")["shalom"] == {"שלום": 2}
+
+
+def test_session_rollback_forgets_ids(dbcache):
+    db = dbcache.db
+    db.session.commit()
+    db.add_many([("ספר", "sefer", "new", 1)])
+    db.session.rollback()
+    db.add_many([("ספר", "sefer", "new", 1)])
+    db.session.commit()
+    assert dbcache["sefer"] == {"ספר": 1}
+
+
+def test_standard_id_after_rollback():
+    db = cacheutils.DBWrapper("sqlite://")
+    new = db.mkcache("new")
+    new.add_many([("sefer", "ספר", 1)])
+    assert new["sefer"] == {"ספר": 1}
+    db.session.rollback()
+    db.mkcache("old").add_many([("sefer", "ספר", 5)])
+    assert new["sefer"] == {}
+    new.add_many([("sefer", "ספר", 1)])
+    assert new["sefer"] == {"ספר": 1}
+
+
+def test_savepoint_rollback(dbcache):
+    db = dbcache.db
+    dbcache.add("shalom", "שלום")
+    db.session.begin_nested()
+    dbcache.add("shalom", "שלום", 2)
+    dbcache.add("sefer", "ספר")
+    db.session.rollback()
+    db.session.commit()
+    assert dbcache["shalom"] == {"שלום": 1}
+    assert dbcache["sefer"] == {}
+    dbcache.add("shalom", "שלום")
+    db.session.begin_nested()
+    assert dbcache["shalom", "שלום"] == 2
+    db.session.rollback()
+    db.session.commit()
+    assert dbcache["shalom", "שלום"] == 2
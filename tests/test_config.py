@@ -0,0 +1,24 @@
+import os
+from deromanize import config, precompile
+
+
+def test_sidecar(tmp_path):
+    path = tmp_path / "schema.yml"
+    path.write_text("keys:\n  base: [a]\n")
+    assert config.load_profile(path) == {"keys": {"base": ["a"]}}
+    assert not config.sidecar_path(path).exists()
+    assert precompile.main([str(path)]) == 0
+    assert config.load_profile(path) == {"keys": {"base": ["a"]}}
+    # same size and mtime, different contents
+    stat = path.stat()
+    path.write_text("keys:\n  base: [b]\n")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert config.load_profile(path) == {"keys": {"base": ["b"]}}
+
+
+def test_schema_dir(tmp_path):
+    for name in ("a.yml", ".b.yml", "c.txt"):
+        (tmp_path / name).touch()
+    schemas = config.get_schemas({"schemas": str(tmp_path)})
+    assert sorted(schemas) == [".b", "a"]
+    assert config.get_schemas({"schemas": str(tmp_path / "missing")}) == {}
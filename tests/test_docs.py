@@ -35,6 +35,14 @@ def test_base_shalom(basic_keys):
     assert str(shalom) == "shalom:\n 0 שלומ\n 1 שלמ"
 
 
+def test_empty_char_sets(basic_keys):
+    profile = get_prof("basic")
+    profile["char_sets"] = {}
+    keys = dr.KeyGenerator(profile)
+    parts = keys["base"].getallparts("shalom")
+    assert repr(parts) == repr(basic_keys["base"].getallparts("shalom"))
+
+
 def main():
     keys = basic_keys()
     test_base_shalom(keys)
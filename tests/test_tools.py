@@ -0,0 +1,62 @@
+import pathlib
+import threading
+import deromanize as dr
+import yaml
+from deromanize import tools
+
+DIR = pathlib.Path(__file__).parent
+
+
+def _wait_for_writers():
+    for thread in threading.enumerate():
+        if thread is not threading.current_thread():
+            thread.join()
+
+
+def test_cached_keys(tmp_path):
+    profile_path = tmp_path / "basic.yml"
+    profile_path.write_bytes((DIR / "basic.yml").read_bytes())
+    cache_path = tmp_path / "basic.cache"
+    loads = []
+
+    def get_keys():
+        def loader(fh):
+            loads.append(fh.name)
+            return yaml.safe_load(fh)
+
+        with profile_path.open(encoding="utf8") as fh:
+            keys = tools.cached_keys(loader, fh, cache_path)
+        _wait_for_writers()
+        return str(dr.add_rlists(keys["base"].getallparts("shalom")))
+
+    built = get_keys()
+    assert len(loads) == 1
+    assert cache_path.exists()
+    assert get_keys() == built
+    assert len(loads) == 1
+    with profile_path.open("a", encoding="utf8") as fh:
+        fh.write("\n# edited\n")
+    assert get_keys() == built
+    assert len(loads) == 2
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_concurrent_cache_writers(tmp_path):
+    cache_path = tmp_path / "keys.cache"
+    data = {"base": [False, {"a": [[0, "א"]] * 1000}]}
+    errors = []
+
+    def write():
+        try:
+            tools.cache_writer(cache_path, data, "digest")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache_path.read_text(encoding="utf8").startswith("digest\n")
+    assert [p.name for p in tmp_path.iterdir()] == ["keys.cache"]
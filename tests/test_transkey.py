@@ -95,12 +95,44 @@ def test_suffixtree(profile, suffixtree):
     assert suffixtree.containsnode("'h")
 
 
+def test_frozen_trie():
+    profile = getbasesdict("consonants", "vowels", "clusters")
+    trie = trees.Trie(profile).freeze()
+    suffixtree = trees.BackTrie(profile).freeze()
+    assert trie.getpart("shalom") == (profile["sh"], "alom")
+    assert suffixtree.getpart("shalom") == (profile["m"], "shalo")
+    with pytest.raises(KeyError):
+        trie.getpart("%")
+    assert trie.getallparts("shalom") == suffixtree.getallparts("shalom")
+    with pytest.raises(KeyError):
+        trie.getallparts("sha%")
+    assert trees.Trie().freeze().getallparts("") == []
+    assert trie.match_prefix("%shalom", 1) == (profile["sh"], 3)
+    assert trie.match_prefix("%shalom") is None
+    assert suffixtree.match_prefix("shalom%", 6) == (profile["m"], 5)
+    assert suffixtree.match_prefix("shalom%") is None
+    assert trees.BackTrie(profile).match_prefix("shalom") == (profile["m"], 5)
+    trie["sha"] = "foo"
+    assert trie.getpart("shalom") == ("foo", "lom")
+    assert trie.match_prefix("%shalom", 1) == ("foo", 4)
+    trie.clear()
+    assert len(trie) == 0
+    trie["sh"] = "foo"
+    assert len(trie) == 1
+
+
 def test_replacement_addition(rep):
     rep3 = rep[0] + rep[1]
     assert rep3.weight == rep[0].weight + rep[1].weight
     assert rep3.values == rep[0].values + rep[1].values
 
 
+def test_replacement_equality(rep):
+    assert rep[0] == deromanize.Replacement.new(0, rep[0].str)
+    assert rep[0] != rep[1]
+    assert rep[0] != rep[0].str
+
+
 def test_replacement_list_addition(rep):
     rlist1 = deromanize.ReplacementList("baz", [rep[0], rep[1]])
     rlist2 = deromanize.ReplacementList("fjords", [rep[2], rep[3]])
@@ -115,6 +147,16 @@ def test_replacement_list_addition(rep):
     assert str(rlist4) == str(rlist3)
 
 
+def test_statreplist_sort():
+    rlist = deromanize.ReplacementList.new(
+        "a", [(1, "x"), (3, "y"), (2, "z")]
+    ).makestat()
+    rlist.prune()
+    assert [str(r) for r in rlist] == ["x", "z", "y"]
+    rlist.sort(reverse=True)
+    assert [str(r) for r in rlist] == ["y", "z", "x"]
+
+
 def test_transkey(key):
     rep = deromanize.add_rlists(key["base"].getallparts("shalom"))
     print(rep)